@@ -1,88 +1,141 @@
 #!/usr/bin/env python3
 import argparse
+import atexit
+import errno
+import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+import threading
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
+from typing import NamedTuple
 
 # ---------- helpers ----------
-def run(cmd, quiet=False):
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if not quiet and p.stderr.strip():
-        for line in p.stderr.splitlines():
+def run(cmd, capture_stdout=False, capture_stderr=False, cwd=None):
+    # uncaptured streams go to /dev/null; captured ones come back as bytes
+    # and are decoded by the caller only if it needs text
+    p = subprocess.run(
+        cmd,
+        cwd=cwd,
+        stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE if capture_stderr else subprocess.DEVNULL,
+        close_fds=False,  # our fds are non-inheritable anyway; skip the fd sweep
+        bufsize=0,
+    )
+    if capture_stderr and p.stderr.strip():
+        for line in p.stderr.decode("utf-8", "replace").splitlines():
             if "don't know how to extract resource" in line:
                 continue
             print(f"[warn] {line}")
     return p.returncode, p.stdout, p.stderr
 
-def ensure_dir(p: Path):
-    p.mkdir(parents=True, exist_ok=True)
+# Paths below the CLI boundary are plain str: the inner loops build and
+# test lots of them, and os.path skips constructing a PurePath each time.
 
-def unique_path(dst: Path) -> Path:
-    if not dst.exists():
+_ensured: set[str] = set()
+
+def ensure_dir(p: str):
+    # only a handful of distinct folders exist; mkdir each of them once
+    if p not in _ensured:
+        os.makedirs(p, exist_ok=True)
+        _ensured.add(p)
+
+def unique_path(dst: str) -> str:
+    if not os.path.lexists(dst):
         return dst
-    stem, suffix = dst.stem, dst.suffix
+    head, name = os.path.split(dst)
+    stem, dot, ext = name.rpartition(".")
+    if not stem:  # no suffix, or a dotfile
+        stem, dot, ext = name, "", ""
     i = 1
     while True:
-        alt = dst.with_name(f"{stem}_{i}{suffix}")
-        if not alt.exists():
+        alt = os.path.join(head, f"{stem}_{i}{dot}{ext}")
+        if not os.path.lexists(alt):
             return alt
         i += 1
 
+# bytes pattern: the listing is scanned without decoding it first
 LINE_RE = re.compile(
-    r"--type=(?P<type>'[^']+'|\d+|[A-Za-z0-9_]+)\s+--name=(?P<name>'[^']+'|\d+)\s+--language=(?P<lang>\d+)"
+    rb"--type=(?P<type>'[^']+'|\d+|[A-Za-z0-9_]+)\s+--name=(?P<name>'[^']+'|\d+)\s+--language=(?P<lang>\d+)"
 )
 
 def wrestool_list(gob: Path):
-    _, out, _ = run(["wrestool", "-l", str(gob)], quiet=True)
+    # stream the listing instead of buffering it; only matches get decoded
+    p = subprocess.Popen(
+        ["wrestool", "-l", str(gob)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        close_fds=False,
+        bufsize=1 << 16,
+    )
     items = []
-    for line in out.splitlines():
-        m = LINE_RE.search(line)
-        if not m:
-            continue
-        typ = m.group("type").strip("'")
-        name = m.group("name").strip("'")
-        lang = m.group("lang")
-        items.append({"type": typ, "name": name, "lang": lang})
+    policies = {}
+    search = LINE_RE.search
+    with p.stdout:
+        for line in p.stdout:
+            # cheap substring check before paying for the regex
+            if b"--language=" not in line:
+                continue
+            m = search(line)
+            if not m:
+                continue
+            # fsdecode round-trips any byte, so the exact name goes back to
+            # wrestool in --type=/--name=
+            typ = os.fsdecode(m.group("type")).strip("'")
+            name = os.fsdecode(m.group("name")).strip("'")
+            lang = m.group("lang").decode("ascii")
+            # resolve the policy once per distinct type, not per resource
+            policy = policies.get(typ)
+            if policy is None:
+                policy = policies[typ] = type_policy(typ.upper())
+            items.append({"type": typ, "name": name, "lang": lang, "policy": policy})
+    p.wait()
     return items
 
 # ---------- extraction policy ----------
-def wanted_folder_and_ext(typ: str, name: str):
-    t = typ.upper()
-    if t in ("2", "BITMAP"):
+class TypePolicy(NamedTuple):
+    folder: str  # output folder under out_root
+    rule: str  # file-name rule, see target_name
+    raw: bool  # extract with wrestool --raw
+
+# uppercase resource type -> policy.
+# wrestool can decode BITMAP, but TABLE/WAVE/STRINGTABLE are taken raw.
+TYPE_POLICY = {
+    "2": TypePolicy("bitmaps", "bmp", raw=False),
+    "BITMAP": TypePolicy("bitmaps", "bmp", raw=False),
+    "WAVE": TypePolicy("wav", "wav", raw=True),
+    "6": TypePolicy("strings", "strtbl", raw=True),  # 6=STRINGTABLE
+    "TABLE": TypePolicy("tables", "bin", raw=True),
+}
+
+def type_policy(t: str) -> TypePolicy:
+    policy = TYPE_POLICY.get(t)
+    if policy is None:
+        # fallback
+        policy = TypePolicy(f"raw/{t.lower()}", "bin", raw=True)
+    return policy
+
+def target_name(rule: str, name: str):
+    if rule == "bmp":
         # keep original name; ensure it ends with .BMP
-        fname = name if name.lower().endswith(".bmp") else f"{name}.BMP"
-        return "bitmaps", fname
-    if t == "WAVE":
+        return name if name.lower().endswith(".bmp") else f"{name}.BMP"
+    if rule == "wav":
         # numeric -> <id>.wav ; string names -> <name>.wav
-        base = name
         # strip any extension from resource name
-        base = base.split(".")[0]
-        return "wav", f"{base}.wav"
-    if t == "6":  # STRINGTABLE
-        base = name
-        return "strings", f"strtbl-{base}.bin"
-    if t == "TABLE":
-        base = name
-        return "tables", f"{base}.bin"
-    # fallback
-    return f"raw/{typ.lower()}", f"{name}.bin"
-
-def can_normal_decode(typ: str):
-    # wrestool can decode BITMAP etc., but not TABLE/WAVE/STRINGTABLE here
-    t = typ.upper()
-    return t in ("2", "BITMAP")
-
-def must_raw(typ: str):
-    t = typ.upper()
-    return t in ("WAVE", "TABLE", "6")  # 6=STRINGTABLE
-
-def build_extract_cmd(gob: Path, typ: str, out_dir: Path, name: str | None = None):
+        return f"{name.split('.')[0]}.wav"
+    if rule == "strtbl":
+        return f"strtbl-{name}.bin"
+    return f"{name}.bin"
+
+def build_extract_cmd(gob: Path, typ: str, policy: TypePolicy, out_dir: str, name: str | None = None):
     cmd = ["wrestool", "-x"]
-    if must_raw(typ) or not can_normal_decode(typ):
+    if policy.raw:
         cmd.append("--raw")
     cmd.append(f"--type={typ}")
     if name is not None:
@@ -90,101 +143,277 @@ def build_extract_cmd(gob: Path, typ: str, out_dir: Path, name: str | None = Non
     cmd.extend(["-o", str(out_dir), str(gob)])
     return cmd
 
-def process_extracted_file(f: Path, item: dict, out_root: Path):
-    typ, name = item["type"], item["name"]
-    folder, suggested_name = wanted_folder_and_ext(typ, name)
-    out_dir = out_root / folder
-    ensure_dir(out_dir)
+STRINGS_README = "These are raw Win32 STRINGTABLE blocks. The .txt files are a quick UTF-16LE skim.\n"
+_strings_readme_written = False
+
+def strings_skim(bins: list):
+    # one `strings` run for the whole batch; -f prefixes every line with the
+    # name of the file it came from. All bins share a folder, so pass bare
+    # names relative to it.
+    out_dir = os.path.dirname(bins[0])
+    names = [os.fsencode(os.path.basename(b)) for b in bins]
+    try:
+        _, out, _ = run(["strings", "-el", "-f", *names], capture_stdout=True, cwd=out_dir)
+    except OSError as e:
+        if e.errno != errno.E2BIG:
+            raise
+        # too many args for one exec: fall back to one run per file
+        return {n: run(["strings", "-el", n], capture_stdout=True, cwd=out_dir)[1] for n in names}
 
-    # Post-process for STRINGTABLE: also create a .txt skim
-    if typ == "6":
-        # move .bin
-        dst_bin = unique_path(out_dir / suggested_name)
-        shutil.move(str(f), str(dst_bin))
-        # txt skim
+    skims = {n: [] for n in names}
+    for line in out.splitlines(keepends=True):
+        name, sep, text = line.partition(b": ")
+        if name not in skims:
+            # the file name itself contains ": "
+            name = next((n for n in skims if line.startswith(n + b": ")), None)
+            if name is None:
+                continue
+            text = line[len(name) + 2:]
+        skims[name].append(text)
+    return {n: b"".join(lines) for n, lines in skims.items()}
+
+def write_string_skims(entries: list):
+    # entries: (dst_bin, suggested .txt path) for each STRINGTABLE block
+    global _strings_readme_written
+    try:
+        skims = strings_skim([dst_bin for dst_bin, _ in entries])
+    except Exception:
+        return
+    if not _strings_readme_written:
+        readme = os.path.join(os.path.dirname(entries[0][0]), "README.txt")
         try:
-            _, out, _ = run(["strings", "-el", str(dst_bin)], quiet=True)
-            (out_dir / "README.txt").write_text(
-                "These are raw Win32 STRINGTABLE blocks. The .txt files are a quick UTF-16LE skim.\n",
-                encoding="utf-8",
-            )
-            dst_txt = unique_path(out_dir / (Path(suggested_name).with_suffix(".txt").name))
-            dst_txt.write_text(out, encoding="utf-8", errors="ignore")
-        except Exception:
+            with open(readme, "w", encoding="utf-8") as fh:
+                fh.write(STRINGS_README)
+            _strings_readme_written = True
+        except OSError:
+            pass
+    for dst_bin, txt in entries:
+        try:
+            with open(unique_path(txt), "wb") as fh:
+                fh.write(skims[os.fsencode(os.path.basename(dst_bin))])
+        except OSError:
             pass
-        return
 
-    # WAVE: ensure .wav extension
-    if typ.upper() == "WAVE":
-        dst = unique_path(out_dir / suggested_name)
-        shutil.move(str(f), str(dst))
-        return
+def process_extracted_file(f: str, item: dict, out_root: str, skims: list):
+    policy = item["policy"]
+    suggested_name = target_name(policy.rule, item["name"])
+    out_dir = os.path.join(out_root, policy.folder)
+    ensure_dir(out_dir)
+
+    # enforce target name
+    dst = unique_path(os.path.join(out_dir, suggested_name))
+    os.replace(f, dst)
+
+    # Post-process for STRINGTABLE: also create a .txt skim, written for the
+    # whole batch by write_string_skims
+    if policy.rule == "strtbl":
+        txt_name = suggested_name.rpartition(".")[0] + ".txt"
+        skims.append((dst, os.path.join(out_dir, txt_name)))
 
-    # BITMAP (or anything else decoded / raw): enforce target name
-    dst = unique_path(out_dir / suggested_name)
-    shutil.move(str(f), str(dst))
+def scan_files(d: str):
+    with os.scandir(d) as it:
+        return [e for e in it if e.is_file(follow_symlinks=False)]
 
-def extract_one(gob: Path, item: dict, out_root: Path):
+_TLS = threading.local()
+
+def scratch(root: str) -> str:
+    # per-thread scratch dir: created on first use, emptied on every later
+    # one. It lives under the run's scratch root, which main removes.
+    d = getattr(_TLS, "d", None)
+    if d is None:
+        d = _TLS.d = tempfile.mkdtemp(dir=root)
+    else:
+        for n in os.listdir(d):
+            os.unlink(os.path.join(d, n))
+    return d
+
+def extract_one(gob: Path, item: dict, tmp: str):
     typ, name = item["type"], item["name"]
 
-    # one-resource temp extraction
-    with tempfile.TemporaryDirectory() as tmpd:
-        tmp = Path(tmpd)
-        run(build_extract_cmd(gob, typ, tmp, name=name), quiet=True)
+    # one-resource extraction into this thread's scratch dir, so the
+    # (possibly large) batch dir does not have to be rescanned
+    d = scratch(os.path.dirname(tmp))
+    run(build_extract_cmd(gob, typ, item["policy"], d, name=name))
+
+    # find the one file wrestool created
+    produced = scan_files(d)
+    if not produced:
+        # nothing came out; skip politely
+        return None
 
-        # find the one file wrestool created
-        produced = [p for p in tmp.iterdir() if p.is_file()]
-        if not produced:
-            # nothing came out; skip politely
-            return
+    # park it with the batch output until the parent moves it into place
+    dst = unique_path(os.path.join(tmp, f"retry-{produced[0].name}"))
+    os.replace(produced[0].path, dst)
+    return dst
 
-        process_extracted_file(produced[0], item, out_root)
+SEG_RE = re.compile(r"[_.]")
 
 def filename_segments(filename: str):
-    return set(re.split(r"[_\.]", filename))
+    return set(SEG_RE.split(filename))
 
-def match_extracted_file(name: str, available_files):
-    candidates = [f for f in available_files if name in filename_segments(f.name)]
+def index_by_segment(names):
+    # inverted index: segment -> file names containing it
+    by_segment = defaultdict(list)
+    for n in names:
+        for seg in filename_segments(n):
+            by_segment[seg].append(n)
+    return by_segment
+
+def index_extracted_files(names):
+    # key each file on its exact stem (extension dropped); stems shared by
+    # several files are ambiguous and map to None
+    index = {}
+    for n in names:
+        key = n.rpartition(".")[0]
+        index[key] = None if key in index else n
+    return index
+
+def lookup_extracted_file(gob: Path, item: dict, index: dict):
+    # wrestool names its output <gob>_<type>_<name>[_<lang>].<ext>
+    base = f"{gob.name}_{item['type']}_{item['name']}"
+    for stem in (f"{base}_{item['lang']}", base):
+        f = index.get(stem)
+        if f is not None:
+            return f
+    return None
+
+def match_extracted_file(name: str, by_segment: dict, available_files):
+    candidates = [f for f in by_segment.get(name, ()) if f in available_files]
     if len(candidates) == 1:
         return candidates[0]
     return None
 
-def extract_batch(gob: Path, items: list, out_root: Path):
+def extract_type(gob: Path, typ: str, type_items: list, tmp: str):
+    run(build_extract_cmd(gob, typ, type_items[0]["policy"], tmp))
+
+    # file names inside tmp; joined into full paths only when handed back
+    available_files = {e.name for e in scan_files(tmp)}
+    index = index_extracted_files(available_files)
+    by_segment = index_by_segment(available_files)
+    matches = [None] * len(type_items)
+    skips = []
+
+    # first pass: claim every exact-stem match, so the loose segment scan
+    # below can never hand one item's file to another
+    for i, it in enumerate(type_items):
+        matched = lookup_extracted_file(gob, it, index)
+        if matched is not None and matched in available_files:
+            matches[i] = matched
+            available_files.remove(matched)
+
+    # second pass: segment fallback over the leftover items and files
+    for i, it in enumerate(type_items):
+        if matches[i] is None:
+            matched = match_extracted_file(it["name"], by_segment, available_files)
+            if matched is not None:
+                matches[i] = matched
+                available_files.remove(matched)
+
+    placements = []
+    retry_items = []
+    for it, matched in zip(type_items, matches):
+        if matched is not None:
+            placements.append((os.path.join(tmp, matched), it))
+        else:
+            retry_items.append(it)
+
+    # last resort: wrestool only takes a single --name, so anything the
+    # batch could not be matched against costs one more invocation
+    for it in retry_items:
+        try:
+            f = extract_one(gob, it, tmp)
+        except Exception as e:
+            # reported by the parent under this gob's heading
+            skips.append(f"{it['type']}:{it['name']} ({e})")
+            continue
+        if f is not None:
+            placements.append((f, it))
+
+    return placements, skips
+
+def extract_batch(gob: Path, items: list, tmp: str):
     # Group by type
     by_type = defaultdict(list)
     for it in items:
         by_type[it["type"]].append(it)
 
-    for typ, type_items in by_type.items():
-        with tempfile.TemporaryDirectory() as tmpd:
-            tmp = Path(tmpd)
-            run(build_extract_cmd(gob, typ, tmp), quiet=True)
-
-            available_files = {p for p in tmp.iterdir() if p.is_file()}
-            retry_items = []
-
-            for it in type_items:
-                matched = match_extracted_file(it["name"], available_files)
-                if matched is not None:
-                    try:
-                        process_extracted_file(matched, it, out_root)
-                        available_files.remove(matched)
-                    except Exception as e:
-                        print(f"    [skip] {it['type']}:{it['name']} ({e})")
-                else:
-                    retry_items.append(it)
-
-            for it in retry_items:
-                try:
-                    extract_one(gob, it, out_root)
-                except Exception as e:
-                    print(f"    [skip] {it['type']}:{it['name']} ({e})")
-
-def copy_fonts(data_dir: Path, out_root: Path):
-    font_out = out_root / "fonts"
+    # one wrestool per type, each in its own dir; run them concurrently
+    # (the threads spend their time waiting on the subprocess)
+    def work(entry):
+        typ, type_items = entry
+        return extract_type(gob, typ, type_items, tempfile.mkdtemp(dir=tmp))
+
+    with ThreadPoolExecutor(max_workers=len(by_type)) as ex:
+        results = list(ex.map(work, by_type.items()))
+    placements = [p for type_placements, _ in results for p in type_placements]
+    skips = [s for _, type_skips in results for s in type_skips]
+    return placements, skips
+
+def place_extracted_files(placements: list, out_root: str):
+    skims = []
+    for f, it in placements:
+        try:
+            process_extracted_file(f, it, out_root, skims)
+        except Exception as e:
+            print(f"    [skip] {it['type']}:{it['name']} ({e})")
+    if skims:
+        write_string_skims(skims)
+
+def _process_gob(gob: Path, tmp: str):
+    # runs in a worker process; only extracts into scratch, the parent moves
+    # files into place (and prints skips) in gob order so name collisions
+    # resolve the same way on every run
+    items = wrestool_list(gob)
+    if not items:
+        return None
+    return extract_batch(gob, items, tempfile.mkdtemp(dir=tmp))
+
+def copy_file(src: Path, dst: str):
+    if not hasattr(os, "copy_file_range"):  # non-Linux
+        shutil.copy2(src, dst)
+        return
+    st = os.stat(src)
+    # O_TRUNC below would wipe the source; refuse like shutil.copy2 does
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        pass
+    else:
+        if (dst_st.st_dev, dst_st.st_ino) == (st.st_dev, st.st_ino):
+            raise shutil.SameFileError(f"{str(src)!r} and {dst!r} are the same file")
+    fd_in = os.open(src, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        fd_out = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, st.st_mode & 0o777)
+        try:
+            # in-kernel copy; offsets advance, so a fallback picks up where it stopped
+            remaining = st.st_size
+            try:
+                while remaining > 0:
+                    n = os.copy_file_range(fd_in, fd_out, remaining)
+                    if n == 0:
+                        # some filesystems (FUSE, NFS/CIFS, ...) report 0
+                        # instead of failing when they don't support it
+                        break
+                    remaining -= n
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+            if remaining > 0:
+                with open(fd_in, "rb", closefd=False) as fsrc, open(fd_out, "wb", closefd=False) as fdst:
+                    shutil.copyfileobj(fsrc, fdst, 1 << 20)
+        finally:
+            os.close(fd_out)
+    finally:
+        os.close(fd_in)
+    # O_CREAT's mode only applies to new files (and through the umask)
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def copy_fonts(data_dir: Path, out_root: str):
+    font_out = os.path.join(out_root, "fonts")
     ensure_dir(font_out)
     for ttf in data_dir.glob("*.ttf"):
-        shutil.copy2(ttf, font_out / ttf.name)
+        copy_file(ttf, os.path.join(font_out, ttf.name))
         print(f"font: {ttf.name}")
 
 def main():
@@ -194,7 +423,7 @@ def main():
     args = ap.parse_args()
 
     data_dir = Path(args.data_dir).expanduser().resolve()
-    out_root = Path(args.out_dir).expanduser().resolve()
+    out_root = str(Path(args.out_dir).expanduser().resolve())
     ensure_dir(out_root)
 
     for tool in ("wrestool",):
@@ -202,15 +431,27 @@ def main():
             print(f"error: required tool '{tool}' not found in PATH", file=sys.stderr)
             sys.exit(1)
 
+    for folder in ("bitmaps", "wav", "strings", "tables", "fonts"):
+        ensure_dir(os.path.join(out_root, folder))
+
+    # scratch root for the whole run, on the same filesystem as the output
+    # so finished files can be renamed into place; workers nest under it
+    tmp = tempfile.mkdtemp(prefix=".extract-", dir=out_root)
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+
     print(f"[*] Scanning .gob in: {data_dir}")
     gobs = sorted(data_dir.glob("*.gob")) + sorted(data_dir.glob("*.GOB"))
-    for gob in gobs:
-        print(f"  → {gob.name}")
-        items = wrestool_list(gob)
-        if not items:
-            print("    (no listable resources)")
-            continue
-        extract_batch(gob, items, out_root)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        results = ex.map(_process_gob, gobs, repeat(tmp), chunksize=1)
+        for gob, result in zip(gobs, results):
+            print(f"  → {gob.name}")
+            if result is None:
+                print("    (no listable resources)")
+                continue
+            placements, skips = result
+            for skip in skips:
+                print(f"    [skip] {skip}")
+            place_extracted_files(placements, out_root)
 
     copy_fonts(data_dir, out_root)
     print(f"[✓] Done → {out_root}")
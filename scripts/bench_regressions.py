@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 import json
 import math
+import operator
 import os
+import re
 import sys
 from pathlib import Path
 
 THRESHOLD = float(os.environ.get("BENCH_REGRESSION_THRESHOLD", "0.05"))
 CRITERION_DIR = Path(os.environ.get("CRITERION_DIR", "target/criterion"))
 
+# Criterion writes "mean" first; its point_estimate sits after the nested
+# confidence_interval object, well within the first few KiB of the file.
+# The number follows JSON grammar, so anything json.loads would reject
+# there falls through to the full parse.
+FAST_RE = re.compile(
+    rb'^\s*\{\s*"mean"\s*:\s*\{(?:[^{}]|\{[^{}]*\})*?"point_estimate"\s*:\s*'
+    rb"(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)\s*[,}]"
+)
+FAST_SCAN_BYTES = 4096
+
 
 def bench_name_from(path: Path) -> str:
     rel = path.relative_to(CRITERION_DIR)
@@ -28,35 +40,52 @@ def main() -> int:
         print("::notice::No benchmark change data found (missing baseline?).")
         return 0
 
+    threshold = THRESHOLD
+    isfinite = math.isfinite
+    fast_match = FAST_RE.match
     regressions = []
     for path in change_files:
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception:
+            raw = path.read_bytes()
+        except OSError:
             continue
 
-        mean = data.get("mean", {}).get("point_estimate")
-        if mean is None or not isinstance(mean, (int, float)):
-            continue
-        if not math.isfinite(mean):
+        m = fast_match(raw, 0, FAST_SCAN_BYTES)
+        # a truncated or garbage-suffixed file must not take the fast path
+        if m is not None and raw.rstrip()[-1:] == b"}":
+            mean = float(m.group(1))
+        else:
+            # unexpected layout: fall back to a full parse
+            try:
+                # strict UTF-8 decode: json.loads(bytes) would accept a BOM
+                mean = json.loads(raw.decode("utf-8"))["mean"]["point_estimate"]
+            except Exception:
+                continue
+            if type(mean) is int:
+                mean = float(mean)
+            elif type(mean) is not float:
+                continue
+        if not isfinite(mean):
             continue
 
-        if mean > THRESHOLD:
+        if mean > threshold:
             regressions.append((bench_name_from(path), mean))
 
     if not regressions:
         print("::notice::No benchmark regressions beyond threshold.")
         return 0
 
-    regressions.sort(key=lambda item: item[1], reverse=True)
-    for name, mean in regressions:
-        pct = mean * 100.0
-        threshold_pct = THRESHOLD * 100.0
-        print(
+    regressions.sort(key=operator.itemgetter(1), reverse=True)
+    threshold_pct = threshold * 100.0
+    sys.stdout.write(
+        "\n".join(
             "::warning title=Benchmark regression::"
-            f"{name} regressed by {pct:.1f}% (mean change). "
+            f"{name} regressed by {mean * 100.0:.1f}% (mean change). "
             f"Threshold {threshold_pct:.1f}%."
+            for name, mean in regressions
         )
+        + "\n"
+    )
 
     return 0
 